@@ -4,82 +4,136 @@ OFAC SDN - Hezbollah Analysis
 Enhanced search for Hezbollah-related entities
 """
 
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 
-def identify_hezbollah_entities():
+from sdn_common import (HAVE_PYARROW, SA_COUNTRIES, SDN_DTYPES, in_countries,
+                        load_cached_table, parquet_cache_path)
+
+DATA_DIR = '/home/claude/'
+
+# HEZBOLLAH, HIZBALLAH, HIZBOLLAH or HIZB ALLAH (which also covers LEBANESE HIZBALLAH),
+# with the shared prefixes factored out so the engine doesn't retry each alternative
+HEZBOLLAH_PATTERN = re.compile('H(?:EZBOLLAH|IZB(?:ALLAH|OLLAH| ALLAH))', re.IGNORECASE)
+
+# Triple border focus
+TRIPLE_BORDER = frozenset(['Argentina', 'Brazil', 'Paraguay'])
+
+def sdn_csv_path(name, data_dir=DATA_DIR):
+    """CSV path of an sdn_full_* table; its Parquet copy sits alongside"""
+    return f'{data_dir}sdn_full_{name}.csv'
+
+def load_sdn_table(name, data_dir=DATA_DIR):
+    """Load a whole sdn_full_* table, caching it as Parquet so later runs skip CSV parsing"""
+    return load_cached_table(sdn_csv_path(name, data_dir))
+
+def filter_sdn_table(name, uid_col, uids, data_dir=DATA_DIR, chunksize=500_000):
+    """Load only the rows of an sdn_full_* table whose uid_col is in uids
+    
+    Only the matching rows are materialized, except when parquet_cache_path first has
+    to (re)build the Parquet copy, which reads the whole CSV once.
+    """
+    if HAVE_PYARROW:
+        # Parquet applies the filter while scanning, so unmatched rows are never materialized
+        return pd.read_parquet(parquet_cache_path(sdn_csv_path(name, data_dir)),
+                               filters=[(uid_col, 'in', list(uids))])
+    
+    csv_path = sdn_csv_path(name, data_dir)
+    chunks = pd.read_csv(csv_path, dtype=SDN_DTYPES, chunksize=chunksize)
+    matches = [chunk[chunk[uid_col].isin(uids)] for chunk in chunks]
+    if not matches:
+        # No chunks to concatenate: return the table's header as an empty frame
+        return pd.read_csv(csv_path, dtype=SDN_DTYPES, nrows=0)
+    return pd.concat(matches, ignore_index=True)
+
+# Child tables only ever needed for the Hezbollah subset; streamed through filter_sdn_table
+SDN_CHILD_TABLES = ('addresses', 'dob', 'pob', 'nationalities', 'ids')
+
+@dataclass
+class SdnTables:
+    """Full OFAC SDN tables searched for Hezbollah links, loaded once and shared by every stage"""
+    entities: pd.DataFrame
+    programs: pd.DataFrame
+    aliases: pd.DataFrame
+
+@lru_cache(maxsize=None)
+def load_sdn_tables(data_dir=DATA_DIR):
+    """Load the searched sdn_full_* tables in one pass (cached per data directory)"""
+    # The readers release the GIL while parsing, so the independent files load concurrently
+    names = [field.name for field in fields(SdnTables)]
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        frames = pool.map(lambda name: load_sdn_table(name, data_dir=data_dir), names)
+        return SdnTables(**dict(zip(names, frames)))
+
+def count_values(series):
+    """value_counts that leaves out unused categories of a categorical column"""
+    counts = series.value_counts()
+    return counts[counts > 0]
+
+def hezbollah_hits(df, columns):
+    """Per-column boolean frame marking cells that mention Hezbollah"""
+    return df[columns].apply(lambda s: s.str.contains(HEZBOLLAH_PATTERN, na=False))
+
+def identify_hezbollah_entities(tables):
     """Identify all Hezbollah-related entities using multiple criteria"""
     
     print("="*60)
     print("IDENTIFYING HEZBOLLAH-RELATED ENTITIES")
     print("="*60)
     
-    # Load data
-    entities = pd.read_csv('/home/claude/sdn_full_entities.csv')
-    programs = pd.read_csv('/home/claude/sdn_full_programs.csv')
-    aliases = pd.read_csv('/home/claude/sdn_full_aliases.csv')
+    entities = tables.entities
+    programs = tables.programs
+    aliases = tables.aliases
+    
+    # Scan each searchable column once; every section below reuses these hits
+    hits = hezbollah_hits(entities, ['last_name', 'first_name', 'remarks'])
+    any_hit = hits.any(axis=1)
+    
+    # Split the programs table by program in a single pass
+    program_uids = programs.groupby('program', observed=True)['uid'].unique()
+    no_uids = np.empty(0, dtype='int64')
     
     hezbollah_uids = set()
     
     # 1. LEBANON program
     print("\n1. Entities in LEBANON program:")
-    lebanon = programs[programs['program'] == 'LEBANON']['uid'].unique()
+    lebanon = program_uids.get('LEBANON', no_uids)
     hezbollah_uids.update(lebanon)
     print(f"   Found {len(lebanon)} entities")
     
     # 2. FTO (Foreign Terrorist Organizations)
     print("\n2. Entities in FTO program:")
-    fto = programs[programs['program'] == 'FTO']['uid'].unique()
-    fto_hezbollah = []
-    for uid in fto:
-        entity = entities[entities['uid'] == uid]
-        name = str(entity['last_name'].values[0]) if len(entity) > 0 else ""
-        remarks = str(entity['remarks'].values[0]) if len(entity) > 0 else ""
-        
-        # Check if Hezbollah is mentioned
-        if any(term in name.upper() for term in ['HEZBOLLAH', 'HIZBALLAH', 'HIZBOLLAH', 'HIZB ALLAH']) or \
-           any(term in remarks.upper() for term in ['HEZBOLLAH', 'HIZBALLAH', 'HIZBOLLAH', 'HIZB ALLAH']):
-            fto_hezbollah.append(uid)
+    fto = program_uids.get('FTO', no_uids)
+    fto_mask = entities['uid'].isin(set(fto)) & (hits['last_name'] | hits['remarks'])
+    fto_hezbollah = entities.loc[fto_mask, 'uid'].unique()
     
     hezbollah_uids.update(fto_hezbollah)
     print(f"   Found {len(fto_hezbollah)} Hezbollah entities in FTO")
     
     # 3. SDGT (Specially Designated Global Terrorists)
     print("\n3. Entities in SDGT program with Hezbollah mentions:")
-    sdgt = programs[programs['program'] == 'SDGT']['uid'].unique()
-    sdgt_hezbollah = []
-    for uid in sdgt:
-        entity = entities[entities['uid'] == uid]
-        name = str(entity['last_name'].values[0]) if len(entity) > 0 else ""
-        first_name = str(entity['first_name'].values[0]) if len(entity) > 0 else ""
-        remarks = str(entity['remarks'].values[0]) if len(entity) > 0 else ""
-        
-        # Check if Hezbollah is mentioned
-        if any(term in name.upper() for term in ['HEZBOLLAH', 'HIZBALLAH', 'HIZBOLLAH', 'HIZB ALLAH']) or \
-           any(term in first_name.upper() for term in ['HEZBOLLAH', 'HIZBALLAH', 'HIZBOLLAH', 'HIZB ALLAH']) or \
-           any(term in remarks.upper() for term in ['HEZBOLLAH', 'HIZBALLAH', 'HIZBOLLAH', 'HIZB ALLAH', 'LEBANESE HIZBALLAH']):
-            sdgt_hezbollah.append(uid)
+    sdgt = program_uids.get('SDGT', no_uids)
+    sdgt_mask = entities['uid'].isin(set(sdgt)) & any_hit
+    sdgt_hezbollah = entities.loc[sdgt_mask, 'uid'].unique()
     
     hezbollah_uids.update(sdgt_hezbollah)
     print(f"   Found {len(sdgt_hezbollah)} Hezbollah entities in SDGT")
     
     # 4. Name-based search across all entities
     print("\n4. Direct name/remarks search across all entities:")
-    name_search = entities[
-        entities['last_name'].str.contains('HEZBOLLAH|HIZBALLAH|HIZBOLLAH|HIZB ALLAH', case=False, na=False) |
-        entities['first_name'].str.contains('HEZBOLLAH|HIZBALLAH|HIZBOLLAH|HIZB ALLAH', case=False, na=False) |
-        entities['remarks'].str.contains('HEZBOLLAH|HIZBALLAH|HIZBOLLAH|HIZB ALLAH|LEBANESE HIZBALLAH', case=False, na=False)
-    ]
+    name_search = entities[any_hit]
     name_search_uids = name_search['uid'].unique()
     hezbollah_uids.update(name_search_uids)
     print(f"   Found {len(name_search_uids)} entities via name/remarks search")
     
     # 5. Alias search
     print("\n5. Alias search:")
-    alias_search = aliases[
-        aliases['last_name'].str.contains('HEZBOLLAH|HIZBALLAH|HIZBOLLAH|HIZB ALLAH', case=False, na=False) |
-        aliases['first_name'].str.contains('HEZBOLLAH|HIZBALLAH|HIZBOLLAH|HIZB ALLAH', case=False, na=False)
-    ]
+    alias_search = aliases[hezbollah_hits(aliases, ['last_name', 'first_name']).any(axis=1)]
     alias_uids = alias_search['entity_uid'].unique()
     hezbollah_uids.update(alias_uids)
     print(f"   Found {len(alias_uids)} entities via alias search")
@@ -90,68 +144,53 @@ def identify_hezbollah_entities():
     
     return list(hezbollah_uids)
 
-def create_hezbollah_dataset(hezbollah_uids):
+def create_hezbollah_dataset(tables, hezbollah_uids, data_dir=DATA_DIR):
     """Create complete dataset for Hezbollah entities"""
     
     print("\nCreating comprehensive Hezbollah dataset...")
     
-    # Load all data
-    entities = pd.read_csv('/home/claude/sdn_full_entities.csv')
-    programs = pd.read_csv('/home/claude/sdn_full_programs.csv')
-    aliases = pd.read_csv('/home/claude/sdn_full_aliases.csv')
-    addresses = pd.read_csv('/home/claude/sdn_full_addresses.csv')
-    dob = pd.read_csv('/home/claude/sdn_full_dob.csv')
-    pob = pd.read_csv('/home/claude/sdn_full_pob.csv')
-    nationalities = pd.read_csv('/home/claude/sdn_full_nationalities.csv')
-    ids = pd.read_csv('/home/claude/sdn_full_ids.csv')
-    
-    # Filter all tables
+    # Build the uid lookup once and reuse it for every table
+    uid_index = pd.Index(sorted(set(hezbollah_uids)), dtype='int64')
+    
+    # Filter the already-loaded tables
     hezbollah_data = {
-        'entities': entities[entities['uid'].isin(hezbollah_uids)],
-        'programs': programs[programs['uid'].isin(hezbollah_uids)],
-        'aliases': aliases[aliases['entity_uid'].isin(hezbollah_uids)],
-        'addresses': addresses[addresses['entity_uid'].isin(hezbollah_uids)],
-        'dob': dob[dob['entity_uid'].isin(hezbollah_uids)],
-        'pob': pob[pob['entity_uid'].isin(hezbollah_uids)],
-        'nationalities': nationalities[nationalities['entity_uid'].isin(hezbollah_uids)],
-        'ids': ids[ids['entity_uid'].isin(hezbollah_uids)]
+        'entities': tables.entities[tables.entities['uid'].isin(uid_index)],
+        'programs': tables.programs[tables.programs['uid'].isin(uid_index)],
+        'aliases': tables.aliases[tables.aliases['entity_uid'].isin(uid_index)]
     }
     
+    # Stream the child tables, keeping only Hezbollah rows in memory
+    with ThreadPoolExecutor(max_workers=len(SDN_CHILD_TABLES)) as pool:
+        frames = pool.map(lambda name: filter_sdn_table(name, 'entity_uid', uid_index, data_dir),
+                          SDN_CHILD_TABLES)
+        hezbollah_data.update(zip(SDN_CHILD_TABLES, frames))
+    
     # Save
     for key, df in hezbollah_data.items():
-        filename = f'/home/claude/hezbollah_{key}.csv'
+        filename = f'{data_dir}hezbollah_{key}.csv'
         df.to_csv(filename, index=False)
         print(f"✓ Saved {filename} ({len(df)} rows)")
     
     return hezbollah_data
 
-def analyze_south_america(hezbollah_data):
+def analyze_south_america(hezbollah_data, data_dir=DATA_DIR):
     """Analyze South American connections"""
     
     print("\n" + "="*60)
     print("SOUTH AMERICAN CONNECTION ANALYSIS")
     print("="*60)
     
-    south_american_countries = [
-        'Argentina', 'Brazil', 'Paraguay', 'Uruguay',
-        'Colombia', 'Venezuela', 'Chile', 'Peru', 'Bolivia',
-        'Ecuador', 'Guyana', 'Suriname', 'French Guiana'
-    ]
-    
-    # Triple border focus
-    triple_border = ['Argentina', 'Brazil', 'Paraguay']
-    
     # Address analysis
     print("\n1. ADDRESS ANALYSIS:")
     sa_addresses = hezbollah_data['addresses'][
-        hezbollah_data['addresses']['country'].isin(south_american_countries)
+        in_countries(hezbollah_data['addresses']['country'], SA_COUNTRIES)
     ]
     
     print(f"   Total SA addresses: {len(sa_addresses)}")
     if len(sa_addresses) > 0:
         print("\n   By country:")
-        for country, count in sa_addresses['country'].value_counts().items():
-            marker = "★" if country in triple_border else " "
+        for country, count in count_values(sa_addresses['country']).items():
+            marker = "★" if country in TRIPLE_BORDER else " "
             print(f"   {marker} {country}: {count}")
     
     sa_address_uids = sa_addresses['entity_uid'].unique()
@@ -159,14 +198,14 @@ def analyze_south_america(hezbollah_data):
     # Nationality analysis
     print("\n2. NATIONALITY ANALYSIS:")
     sa_nationalities = hezbollah_data['nationalities'][
-        hezbollah_data['nationalities']['country'].isin(south_american_countries)
+        in_countries(hezbollah_data['nationalities']['country'], SA_COUNTRIES)
     ]
     
     print(f"   Total SA nationality records: {len(sa_nationalities)}")
     if len(sa_nationalities) > 0:
         print("\n   By country:")
-        for country, count in sa_nationalities['country'].value_counts().items():
-            marker = "★" if country in triple_border else " "
+        for country, count in count_values(sa_nationalities['country']).items():
+            marker = "★" if country in TRIPLE_BORDER else " "
             print(f"   {marker} {country}: {count}")
     
     sa_nationality_uids = sa_nationalities['entity_uid'].unique()
@@ -174,18 +213,18 @@ def analyze_south_america(hezbollah_data):
     # ID documents
     print("\n3. ID DOCUMENT ANALYSIS:")
     sa_ids = hezbollah_data['ids'][
-        hezbollah_data['ids']['id_country'].isin(south_american_countries)
+        in_countries(hezbollah_data['ids']['id_country'], SA_COUNTRIES)
     ]
     
     print(f"   Total SA ID documents: {len(sa_ids)}")
     if len(sa_ids) > 0:
         print("\n   By country:")
-        for country, count in sa_ids['id_country'].value_counts().items():
-            marker = "★" if country in triple_border else " "
+        for country, count in count_values(sa_ids['id_country']).items():
+            marker = "★" if country in TRIPLE_BORDER else " "
             print(f"   {marker} {country}: {count}")
         
         print("\n   By ID type:")
-        for id_type, count in sa_ids['id_type'].value_counts().head(10).items():
+        for id_type, count in count_values(sa_ids['id_type']).head(10).items():
             print(f"     {id_type}: {count}")
     
     sa_id_uids = sa_ids['entity_uid'].unique()
@@ -220,7 +259,7 @@ def analyze_south_america(hezbollah_data):
     }
     
     for key, df in sa_data.items():
-        filename = f'/home/claude/hezbollah_southamerica_{key}.csv'
+        filename = f'{data_dir}hezbollah_southamerica_{key}.csv'
         df.to_csv(filename, index=False)
         print(f"\n✓ Saved {filename}")
     
@@ -237,6 +276,14 @@ def print_sample_entities(hezbollah_data, sa_uids):
         hezbollah_data['entities']['uid'].isin(sa_uids)
     ]
     
+    # Group the child tables by uid once instead of rescanning them per entity
+    programs = hezbollah_data['programs']
+    program_rows = programs.groupby('uid').indices
+    addresses = hezbollah_data['addresses']
+    addresses = addresses[addresses['country'].isin(['Argentina', 'Brazil', 'Paraguay', 'Uruguay',
+                                                     'Colombia', 'Venezuela', 'Chile', 'Peru'])]
+    address_rows = addresses.groupby('entity_uid').indices
+    
     for idx, row in sa_entities.head(10).iterrows():
         uid = row['uid']
         print(f"\nUID: {uid}")
@@ -245,16 +292,12 @@ def print_sample_entities(hezbollah_data, sa_uids):
         print(f"Name: {name.strip()}")
         
         # Programs
-        progs = hezbollah_data['programs'][hezbollah_data['programs']['uid'] == uid]
+        progs = programs.iloc[program_rows.get(uid, [])]
         if len(progs) > 0:
             print(f"Programs: {', '.join(progs['program'].unique())}")
         
         # SA Addresses
-        addrs = hezbollah_data['addresses'][
-            (hezbollah_data['addresses']['entity_uid'] == uid) &
-            (hezbollah_data['addresses']['country'].isin(['Argentina', 'Brazil', 'Paraguay', 'Uruguay', 
-                                                           'Colombia', 'Venezuela', 'Chile', 'Peru']))
-        ]
+        addrs = addresses.iloc[address_rows.get(uid, [])]
         if len(addrs) > 0:
             print("SA Addresses:")
             for _, addr in addrs.iterrows():
@@ -267,11 +310,14 @@ def print_sample_entities(hezbollah_data, sa_uids):
             print(f"Remarks: {remarks}...")
 
 if __name__ == "__main__":
+    # Load the full SDN tables once for every stage
+    tables = load_sdn_tables()
+    
     # Identify all Hezbollah entities
-    hezbollah_uids = identify_hezbollah_entities()
+    hezbollah_uids = identify_hezbollah_entities(tables)
     
     # Create full dataset
-    hezbollah_data = create_hezbollah_dataset(hezbollah_uids)
+    hezbollah_data = create_hezbollah_dataset(tables, hezbollah_uids)
     
     # Analyze South American connections
     sa_data, sa_uids = analyze_south_america(hezbollah_data)
@@ -4,42 +4,65 @@ Data Integration Toolkit
 Tools for cross-referencing new sources with OFAC data
 """
 
+import numpy as np
 import pandas as pd
 import re
-from fuzzywuzzy import fuzz
+from rapidfuzz import fuzz, process
 from datetime import datetime
 
+from sdn_common import load_cached_table
+
 class HezbollahDataIntegrator:
     """Integrate and cross-reference Hezbollah data from multiple sources"""
     
+    # Capitalized names (2-4 words). The capital, lowercase and whitespace classes are
+    # disjoint, so each word boundary is unambiguous and matching stays linear in the text
+    _NAME_RE = re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})\b')
+    # Common titles and whitespace runs stripped by name normalization
+    _TITLE_RE = re.compile(r'\b(MR|MRS|MS|DR|PROF|SR|JR)\b\.?')
+    _WS_RE = re.compile(r'\s+')
+    
     def __init__(self, ofac_data_dir='/home/claude/'):
         """Load OFAC baseline data"""
         print("Loading OFAC baseline data...")
-        self.entities = pd.read_csv(f'{ofac_data_dir}hezbollah_entities.csv')
-        self.aliases = pd.read_csv(f'{ofac_data_dir}hezbollah_aliases.csv')
-        self.addresses = pd.read_csv(f'{ofac_data_dir}hezbollah_addresses.csv')
-        self.ids = pd.read_csv(f'{ofac_data_dir}hezbollah_ids.csv')
+        self.entities = self._load_table(ofac_data_dir, 'entities')
+        self.aliases = self._load_table(ofac_data_dir, 'aliases')
+        self.addresses = self._load_table(ofac_data_dir, 'addresses')
+        self.ids = self._load_table(ofac_data_dir, 'ids')
         
         # Build name index for fast lookups
         self.name_index = self._build_name_index()
+        # Parallel name/uid arrays so fuzzy scoring can run as one batched rapidfuzz call
+        self._names_arr = np.fromiter(self.name_index.keys(), dtype=object, count=len(self.name_index))
+        self._uids_arr = np.fromiter(self.name_index.values(), dtype=np.int64, count=len(self.name_index))
+        
+        # uid -> row positions, so profile lookups skip full-table scans
+        self._entity_rows = self.entities.groupby('uid').indices
+        self._alias_rows = self.aliases.groupby('entity_uid').indices
+        self._address_rows = self.addresses.groupby('entity_uid').indices
+        self._id_rows = self.ids.groupby('entity_uid').indices
         print(f"✓ Loaded {len(self.entities)} OFAC entities")
         print(f"✓ Built index with {len(self.name_index)} names/aliases")
     
+    def _load_table(self, ofac_data_dir, name):
+        """Load a hezbollah_* table, caching it as Parquet so later loads skip CSV parsing"""
+        return load_cached_table(f'{ofac_data_dir}hezbollah_{name}.csv')
+    
+    def _rows_for_uid(self, table, row_index, uid):
+        """Rows of table belonging to uid, looked up in a prebuilt uid -> positions index"""
+        return table.iloc[row_index.get(uid, [])]
+    
     def _build_name_index(self):
         """Build searchable index of all names and aliases"""
-        names = {}
-        
         # Primary names
-        for _, entity in self.entities.iterrows():
-            full_name = f"{entity['first_name'] if pd.notna(entity['first_name']) else ''} {entity['last_name']}"
-            full_name = full_name.strip().upper()
-            names[full_name] = entity['uid']
+        e = self.entities
+        full_names = (e['first_name'].fillna('') + ' ' + e['last_name'].fillna('')).str.strip().str.upper()
+        names = dict(zip(full_names.tolist(), e['uid'].tolist()))
         
         # Aliases
-        for _, alias in self.aliases.iterrows():
-            full_name = f"{alias['first_name'] if pd.notna(alias['first_name']) else ''} {alias['last_name']}"
-            full_name = full_name.strip().upper()
-            names[full_name] = alias['entity_uid']
+        a = self.aliases
+        full_names = (a['first_name'].fillna('') + ' ' + a['last_name'].fillna('')).str.strip().str.upper()
+        names.update(zip(full_names.tolist(), a['entity_uid'].tolist()))
         
         return names
     
@@ -49,11 +72,18 @@ class HezbollahDataIntegrator:
             return ""
         name = str(name).upper()
         # Remove common titles
-        name = re.sub(r'\b(MR|MRS|MS|DR|PROF|SR|JR)\b\.?', '', name)
+        name = self._TITLE_RE.sub('', name)
         # Remove extra whitespace
         name = ' '.join(name.split())
         return name
     
+    def _normalize_series(self, names):
+        """Vectorized normalize_name over a whole Series of names"""
+        return (names.fillna('').astype(str).str.upper()
+                .str.replace(self._TITLE_RE, '', regex=True)
+                .str.replace(self._WS_RE, ' ', regex=True)
+                .str.strip())
+    
     def exact_match(self, name):
         """Check for exact match in OFAC data"""
         normalized = self.normalize_name(name)
@@ -62,41 +92,45 @@ class HezbollahDataIntegrator:
     def fuzzy_match(self, name, threshold=85):
         """Find fuzzy matches using Levenshtein distance"""
         normalized = self.normalize_name(name)
-        matches = []
-        
-        for ofac_name, uid in self.name_index.items():
-            score = fuzz.ratio(normalized, ofac_name)
-            if score >= threshold:
-                matches.append({
-                    'uid': uid,
-                    'ofac_name': ofac_name,
-                    'input_name': name,
-                    'match_score': score
-                })
+        # Cut off half a point low, then apply the threshold to the rounded score,
+        # which is the integer score fuzzywuzzy compared against
+        scored = process.extract(normalized, self._names_arr, scorer=fuzz.ratio,
+                                 score_cutoff=max(threshold - 0.5, 0), limit=None)
         
-        return sorted(matches, key=lambda x: x['match_score'], reverse=True)
+        # extract() already returns matches best-first
+        return [{
+            'uid': int(self._uids_arr[idx]),
+            'ofac_name': ofac_name,
+            'input_name': name,
+            'match_score': round(score)
+        } for ofac_name, score, idx in scored if round(score) >= threshold]
     
     def search_by_location(self, country=None, city=None):
         """Find entities with connections to specific locations"""
-        results = self.addresses.copy()
+        df = self.addresses
+        mask = None
         
+        # Plain substring tests (regex=False) combined into a single mask, no copies
         if country:
-            results = results[results['country'].str.contains(country, case=False, na=False)]
+            mask = df['country'].str.contains(country, case=False, na=False, regex=False)
         if city:
-            results = results[results['city'].str.contains(city, case=False, na=False)]
+            city_mask = df['city'].str.contains(city, case=False, na=False, regex=False)
+            mask = city_mask if mask is None else (mask & city_mask)
         
-        return results
+        return df if mask is None else df.loc[mask]
     
     def search_by_id(self, id_number=None, id_type=None):
         """Search by ID number or type"""
-        results = self.ids.copy()
+        df = self.ids
+        mask = None
         
         if id_number:
-            results = results[results['id_number'].str.contains(str(id_number), case=False, na=False)]
+            mask = df['id_number'].str.contains(str(id_number), case=False, na=False, regex=False)
         if id_type:
-            results = results[results['id_type'].str.contains(id_type, case=False, na=False)]
+            type_mask = df['id_type'].str.contains(id_type, case=False, na=False, regex=False)
+            mask = type_mask if mask is None else (mask & type_mask)
         
-        return results
+        return df if mask is None else df.loc[mask]
     
     def get_entity_profile(self, uid):
         """Get complete profile for an entity"""
@@ -104,62 +138,83 @@ class HezbollahDataIntegrator:
         if isinstance(uid, str):
             uid = int(uid)
         
-        entity_df = self.entities[self.entities['uid'] == uid]
-        if len(entity_df) == 0:
+        entity_rows = self._entity_rows.get(uid)
+        if entity_rows is None:
             return None
         
-        entity = entity_df.iloc[0]
+        entity = self.entities.iloc[entity_rows[0]]
         
+        # Child records stay as DataFrames rather than per-row dicts
         profile = {
             'uid': uid,
             'basic_info': entity.to_dict(),
-            'aliases': self.aliases[self.aliases['entity_uid'] == uid].to_dict('records'),
-            'addresses': self.addresses[self.addresses['entity_uid'] == uid].to_dict('records'),
-            'ids': self.ids[self.ids['entity_uid'] == uid].to_dict('records')
+            'aliases': self._rows_for_uid(self.aliases, self._alias_rows, uid),
+            'addresses': self._rows_for_uid(self.addresses, self._address_rows, uid),
+            'ids': self._rows_for_uid(self.ids, self._id_rows, uid)
         }
         
         return profile
     
     def batch_search_names(self, names_list, fuzzy=True, threshold=85):
         """Search for multiple names at once"""
-        results = []
+        results = {}
+        # Any iterable (Series, set, generator): materialise once so positions index it
+        names_list = list(names_list)
+        
+        # Normalize every input in one vectorized pass
+        normalized = self._normalize_series(pd.Series(names_list, dtype=object)).tolist()
         
-        for name in names_list:
-            # Try exact match first
-            uid = self.exact_match(name)
+        # Try exact match first
+        pending = []
+        for pos, name in enumerate(names_list):
+            uid = self.name_index.get(normalized[pos])
             if uid:
-                results.append({
+                results[pos] = {
                     'input_name': name,
                     'match_type': 'exact',
                     'uid': uid,
                     'match_score': 100
-                })
+                }
             elif fuzzy:
-                # Try fuzzy match
-                fuzzy_matches = self.fuzzy_match(name, threshold)
-                if fuzzy_matches:
-                    results.append({
-                        'input_name': name,
-                        'match_type': 'fuzzy',
-                        'uid': fuzzy_matches[0]['uid'],
-                        'ofac_name': fuzzy_matches[0]['ofac_name'],
-                        'match_score': fuzzy_matches[0]['match_score']
-                    })
-                else:
-                    results.append({
-                        'input_name': name,
-                        'match_type': 'no_match',
-                        'uid': None,
-                        'match_score': 0
-                    })
+                pending.append(pos)
         
-        return pd.DataFrame(results)
+        # Score each distinct unmatched name once, all in one batched call
+        queries = list(dict.fromkeys(normalized[pos] for pos in pending))
+        best = {}
+        if queries and len(self._names_arr):
+            # Same rounded-score threshold as fuzzy_match
+            scores = process.cdist(queries, self._names_arr, scorer=fuzz.ratio,
+                                   score_cutoff=max(threshold - 0.5, 0), workers=-1)
+            best_idx = scores.argmax(axis=1)
+            best_score = scores[np.arange(len(queries)), best_idx]
+            for query, idx, score in zip(queries, best_idx, best_score):
+                if round(score) >= threshold:
+                    best[query] = (idx, score)
+        
+        for pos in pending:
+            name = names_list[pos]
+            if normalized[pos] in best:
+                idx, score = best[normalized[pos]]
+                results[pos] = {
+                    'input_name': name,
+                    'match_type': 'fuzzy',
+                    'uid': int(self._uids_arr[idx]),
+                    'ofac_name': self._names_arr[idx],
+                    'match_score': round(score)
+                }
+            else:
+                results[pos] = {
+                    'input_name': name,
+                    'match_type': 'no_match',
+                    'uid': None,
+                    'match_score': 0
+                }
+        
+        return pd.DataFrame([results[pos] for pos in sorted(results)])
     
     def extract_names_from_text(self, text):
         """Extract potential names from unstructured text"""
-        # Simple pattern for capitalized names (2-4 words)
-        pattern = r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})\b'
-        matches = re.findall(pattern, text)
+        matches = self._NAME_RE.findall(text)
         return list(set(matches))  # Remove duplicates
     
     def process_new_source(self, data, name_column=None, location_column=None):
@@ -4,227 +4,309 @@ OFAC SDN XML Parser
 Extracts and structures data from the OFAC Specially Designated Nationals list
 """
 
-import xml.etree.ElementTree as ET
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import sys
+from lxml import etree as ET
+import numpy as np
 import pandas as pd
 import json
+import re
 from datetime import datetime
 
-def parse_sdn_xml(xml_file):
-    """Parse the SDN XML file and extract all relevant data"""
+from sdn_common import HAVE_PYARROW, SA_COUNTRIES, in_countries
+
+OUTPUT_DIR = '/home/claude/'
+
+# SDN XML namespace
+NS = {'sdn': 'https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/XML'}
+
+# Program names that mark a Hezbollah designation
+HEZBOLLAH_PROGRAM_PATTERN = re.compile('HEZBOLLAH|HIZBALLAH|HIZBOLLAH', re.IGNORECASE)
+
+# Sub-list selectors, compiled once so libxml2 resolves them for every entry
+_PROGRAMS = ET.XPath('sdn:programList/sdn:program', namespaces=NS)
+_AKAS = ET.XPath('sdn:akaList/sdn:aka', namespaces=NS)
+_ADDRESSES = ET.XPath('sdn:addressList/sdn:address', namespaces=NS)
+_DOBS = ET.XPath('sdn:dateOfBirthList/sdn:dateOfBirthItem', namespaces=NS)
+_POBS = ET.XPath('sdn:placeOfBirthList/sdn:placeOfBirthItem', namespaces=NS)
+_NATIONALITIES = ET.XPath('sdn:nationalityList/sdn:nationality', namespaces=NS)
+_IDS = ET.XPath('sdn:idList/sdn:id', namespaces=NS)
+
+def _clark(tag):
+    """Resolve an SDN tag to Clark notation once, so find() skips prefix parsing"""
+    return f"{{{NS['sdn']}}}{tag}"
+
+# Top-level elements streamed by iterparse
+_PUB_INFO_TAG = _clark('publshInformation')
+_ENTRY_TAG = _clark('sdnEntry')
+_UID_TAG = _clark('uid')
+_PUBLISH_DATE_TAG = _clark('Publish_Date')
+_RECORD_COUNT_TAG = _clark('Record_Count')
+
+# (XML child tag, output column) extracted for each record type
+ENTITY_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'uid'), ('sdnType', 'sdn_type'), ('firstName', 'first_name'),
+    ('lastName', 'last_name'), ('title', 'title'), ('remarks', 'remarks')
+])
+AKA_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'aka_uid'), ('type', 'type'), ('category', 'category'),
+    ('firstName', 'first_name'), ('lastName', 'last_name')
+])
+ADDRESS_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'address_uid'), ('address1', 'address1'), ('address2', 'address2'),
+    ('address3', 'address3'), ('city', 'city'), ('stateOrProvince', 'state_province'),
+    ('postalCode', 'postal_code'), ('country', 'country')
+])
+DOB_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'dob_uid'), ('dateOfBirth', 'date_of_birth'), ('mainEntry', 'main_entry')
+])
+POB_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'pob_uid'), ('placeOfBirth', 'place_of_birth'), ('mainEntry', 'main_entry')
+])
+NATIONALITY_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'nationality_uid'), ('country', 'country'), ('mainEntry', 'main_entry')
+])
+ID_FIELDS = tuple((_clark(tag), column) for tag, column in [
+    ('uid', 'id_uid'), ('idType', 'id_type'), ('idNumber', 'id_number'),
+    ('idCountry', 'id_country'), ('issueDate', 'issue_date'),
+    ('expirationDate', 'expiration_date')
+])
+
+# Fields with a handful of distinct values, shared through one str object per value
+_SMALL_DOMAIN_TAGS = frozenset(_clark(tag) for tag in [
+    'sdnType', 'type', 'category', 'country', 'idType', 'idCountry', 'mainEntry'
+])
+
+def _new_columns(fields, parent=None):
+    """Empty column-oriented accumulator for a record type, parent uid column first
+    
+    uid columns are typed int64 buffers, so they never hold Python int objects;
+    text columns stay plain lists.
+    """
+    columns = {parent: array('q')} if parent else {}
+    columns.update((column, array('q') if tag == _UID_TAG else []) for tag, column in fields)
+    return columns
+
+def _to_frame(columns):
+    """Wrap an accumulator as a DataFrame; uid buffers become int64 arrays without a copy"""
+    return pd.DataFrame({
+        column: np.frombuffer(values, dtype=np.int64) if isinstance(values, array) else values
+        for column, values in columns.items()
+    }, copy=False)
+
+def _append_record(columns, elem, fields, strings, parent_uid=None):
+    """Append each (tag, column) child of elem straight onto its column, uids as ints
+    
+    No per-row dict: the only allocation per field is the value itself, and
+    small-domain values are swapped for the first equal str seen (strings cache).
+    """
+    if parent_uid is not None:
+        columns['entity_uid'].append(parent_uid)
+    for tag, column in fields:
+        # findtext gives '' for an empty element; keep it null like a missing one
+        text = elem.findtext(tag) or None
+        if tag == _UID_TAG:
+            text = int(text)
+        elif tag in _SMALL_DOMAIN_TAGS:
+            text = strings.setdefault(text, text)
+        columns[column].append(text)
+
+def _release(entry):
+    """Free a finished entry and the already-processed siblings before it"""
+    entry.clear(keep_tail=True)
+    while entry.getprevious() is not None:
+        del entry.getparent()[0]
+
+def find_hezbollah_uids(xml_file):
+    """Light first pass: uids of entries with a Hezbollah program, reading only uid and programs"""
+    
+    hezbollah_uids = set()
+    for _, entry in ET.iterparse(xml_file, events=('end',), tag=_ENTRY_TAG):
+        if any(HEZBOLLAH_PROGRAM_PATTERN.search(prog.text or '') for prog in _PROGRAMS(entry)):
+            hezbollah_uids.add(int(entry.findtext(_UID_TAG)))
+        _release(entry)
+    
+    return hezbollah_uids
+
+def _new_accumulators():
+    """Empty column-oriented accumulators for every record type, keyed like the output frames"""
+    return {
+        'entities': _new_columns(ENTITY_FIELDS),
+        'programs': {'uid': array('q'), 'program': []},
+        'aliases': _new_columns(AKA_FIELDS, 'entity_uid'),
+        'addresses': _new_columns(ADDRESS_FIELDS, 'entity_uid'),
+        'dob': _new_columns(DOB_FIELDS, 'entity_uid'),
+        'pob': _new_columns(POB_FIELDS, 'entity_uid'),
+        'nationalities': _new_columns(NATIONALITY_FIELDS, 'entity_uid'),
+        'ids': _new_columns(ID_FIELDS, 'entity_uid'),
+    }
+
+def _extract_entity(entry, columns, strings):
+    """Append the entry's own fields and return its uid"""
+    _append_record(columns, entry, ENTITY_FIELDS, strings)
+    return columns['uid'][-1]
+
+def _extract_programs(entry, uid, columns, strings):
+    """Append one (uid, program) row per program the entry is listed under"""
+    uids, names = columns['uid'], columns['program']
+    for prog in _PROGRAMS(entry):
+        uids.append(uid)
+        program = prog.text
+        names.append(strings.setdefault(program, program))
+
+def _extract_sublist(entry, uid, columns, select, fields, strings):
+    """Append every record of one sub-list (selected by select) under the entity uid"""
+    for elem in select(entry):
+        _append_record(columns, elem, fields, strings, uid)
+
+# (output key, selector, fields) for the sub-lists that share one record layout
+_SUBLISTS = (
+    ('aliases', _AKAS, AKA_FIELDS),
+    ('addresses', _ADDRESSES, ADDRESS_FIELDS),
+    ('dob', _DOBS, DOB_FIELDS),
+    ('pob', _POBS, POB_FIELDS),
+    ('nationalities', _NATIONALITIES, NATIONALITY_FIELDS),
+    ('ids', _IDS, ID_FIELDS),  # passports, tax IDs, etc.
+)
+
+def _parse_entry(entry, acc, strings):
+    """Append one sdnEntry and all of its sub-list records onto the accumulators"""
+    uid = _extract_entity(entry, acc['entities'], strings)
+    _extract_programs(entry, uid, acc['programs'], strings)
+    for key, select, fields in _SUBLISTS:
+        _extract_sublist(entry, uid, acc[key], select, fields, strings)
+
+def _parse_batch(batch):
+    """Worker side of a parallel parse: extract a batch of serialized sdnEntry elements"""
+    acc = _new_accumulators()
+    strings = {}
+    for raw in batch:
+        _parse_entry(ET.fromstring(raw), acc, strings)
+    return acc
+
+def _merge_accumulators(acc, part):
+    """Append a worker's accumulators onto the driver's, column by column"""
+    for key, columns in part.items():
+        for column, values in columns.items():
+            acc[key][column].extend(values)
+
+# sdnEntry elements shipped to a worker per task in a parallel parse
+_BATCH_SIZE = 256
+
+# Workers inherit module state by forking; not available on Windows and unsafe on macOS
+_CAN_FORK = 'fork' in multiprocessing.get_all_start_methods() and sys.platform != 'darwin'
+
+def extract_sdn_columns(xml_file, target_uids=None, workers=None):
+    """Extract the SDN XML file into plain column accumulators, returning (columns, pub_date)
+    
+    Pure Python over lxml, with no pandas involved; build_sdn_frames turns the
+    result into DataFrames. With target_uids (any iterable of uids), every other
+    entry is skipped before any of its records are extracted. With workers > 1,
+    entries are serialized in batches and extracted in a pool of forked processes
+    (serially where fork is unavailable); the XML scan stays serial.
+    """
     
     print("Parsing SDN XML file...")
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    
-    # Define namespace
-    ns = {'sdn': 'https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/XML'}
-    
-    # Get publication info
-    pub_info = root.find('sdn:publshInformation', ns)
-    if pub_info is not None:
-        pub_date = pub_info.find('sdn:Publish_Date', ns).text
-        record_count = pub_info.find('sdn:Record_Count', ns).text
-        print(f"Publication Date: {pub_date}")
-        print(f"Total Records: {record_count}")
-    
-    # Lists to store structured data
-    entities = []
-    aliases = []
-    addresses = []
-    dates_of_birth = []
-    places_of_birth = []
-    nationalities = []
-    identifications = []
-    programs = []
-    
-    # Parse each SDN entry
-    entries = root.findall('sdn:sdnEntry', ns)
-    print(f"\nProcessing {len(entries)} entries...")
-    
-    for entry in entries:
-        # Basic entity information
-        uid = entry.find('sdn:uid', ns).text
-        last_name = entry.find('sdn:lastName', ns)
-        last_name = last_name.text if last_name is not None else None
-        first_name = entry.find('sdn:firstName', ns)
-        first_name = first_name.text if first_name is not None else None
-        sdn_type = entry.find('sdn:sdnType', ns).text
-        title = entry.find('sdn:title', ns)
-        title = title.text if title is not None else None
-        
-        # Remarks/notes
-        remarks = entry.find('sdn:remarks', ns)
-        remarks = remarks.text if remarks is not None else None
-        
-        # Entity data
-        entity_data = {
-            'uid': uid,
-            'sdn_type': sdn_type,
-            'first_name': first_name,
-            'last_name': last_name,
-            'title': title,
-            'remarks': remarks
-        }
-        entities.append(entity_data)
-        
-        # Programs
-        program_list = entry.find('sdn:programList', ns)
-        if program_list is not None:
-            for prog in program_list.findall('sdn:program', ns):
-                programs.append({
-                    'uid': uid,
-                    'program': prog.text
-                })
-        
-        # Aliases (AKA)
-        aka_list = entry.find('sdn:akaList', ns)
-        if aka_list is not None:
-            for aka in aka_list.findall('sdn:aka', ns):
-                aka_uid = aka.find('sdn:uid', ns).text
-                aka_type = aka.find('sdn:type', ns).text
-                aka_category = aka.find('sdn:category', ns)
-                aka_category = aka_category.text if aka_category is not None else None
-                aka_last_name = aka.find('sdn:lastName', ns)
-                aka_last_name = aka_last_name.text if aka_last_name is not None else None
-                aka_first_name = aka.find('sdn:firstName', ns)
-                aka_first_name = aka_first_name.text if aka_first_name is not None else None
-                
-                aliases.append({
-                    'entity_uid': uid,
-                    'aka_uid': aka_uid,
-                    'type': aka_type,
-                    'category': aka_category,
-                    'first_name': aka_first_name,
-                    'last_name': aka_last_name
-                })
-        
-        # Addresses
-        address_list = entry.find('sdn:addressList', ns)
-        if address_list is not None:
-            for addr in address_list.findall('sdn:address', ns):
-                addr_uid = addr.find('sdn:uid', ns).text
-                addr1 = addr.find('sdn:address1', ns)
-                addr1 = addr1.text if addr1 is not None else None
-                addr2 = addr.find('sdn:address2', ns)
-                addr2 = addr2.text if addr2 is not None else None
-                addr3 = addr.find('sdn:address3', ns)
-                addr3 = addr3.text if addr3 is not None else None
-                city = addr.find('sdn:city', ns)
-                city = city.text if city is not None else None
-                state_prov = addr.find('sdn:stateOrProvince', ns)
-                state_prov = state_prov.text if state_prov is not None else None
-                postal = addr.find('sdn:postalCode', ns)
-                postal = postal.text if postal is not None else None
-                country = addr.find('sdn:country', ns)
-                country = country.text if country is not None else None
-                
-                addresses.append({
-                    'entity_uid': uid,
-                    'address_uid': addr_uid,
-                    'address1': addr1,
-                    'address2': addr2,
-                    'address3': addr3,
-                    'city': city,
-                    'state_province': state_prov,
-                    'postal_code': postal,
-                    'country': country
-                })
-        
-        # Dates of Birth
-        dob_list = entry.find('sdn:dateOfBirthList', ns)
-        if dob_list is not None:
-            for dob in dob_list.findall('sdn:dateOfBirthItem', ns):
-                dob_uid = dob.find('sdn:uid', ns).text
-                dob_date = dob.find('sdn:dateOfBirth', ns)
-                dob_date = dob_date.text if dob_date is not None else None
-                main_entry = dob.find('sdn:mainEntry', ns)
-                main_entry = main_entry.text if main_entry is not None else None
-                
-                dates_of_birth.append({
-                    'entity_uid': uid,
-                    'dob_uid': dob_uid,
-                    'date_of_birth': dob_date,
-                    'main_entry': main_entry
-                })
-        
-        # Places of Birth
-        pob_list = entry.find('sdn:placeOfBirthList', ns)
-        if pob_list is not None:
-            for pob in pob_list.findall('sdn:placeOfBirthItem', ns):
-                pob_uid = pob.find('sdn:uid', ns).text
-                pob_place = pob.find('sdn:placeOfBirth', ns)
-                pob_place = pob_place.text if pob_place is not None else None
-                main_entry = pob.find('sdn:mainEntry', ns)
-                main_entry = main_entry.text if main_entry is not None else None
-                
-                places_of_birth.append({
-                    'entity_uid': uid,
-                    'pob_uid': pob_uid,
-                    'place_of_birth': pob_place,
-                    'main_entry': main_entry
-                })
-        
-        # Nationalities
-        nat_list = entry.find('sdn:nationalityList', ns)
-        if nat_list is not None:
-            for nat in nat_list.findall('sdn:nationality', ns):
-                nat_uid = nat.find('sdn:uid', ns).text
-                nat_country = nat.find('sdn:country', ns)
-                nat_country = nat_country.text if nat_country is not None else None
-                main_entry = nat.find('sdn:mainEntry', ns)
-                main_entry = main_entry.text if main_entry is not None else None
-                
-                nationalities.append({
-                    'entity_uid': uid,
-                    'nationality_uid': nat_uid,
-                    'country': nat_country,
-                    'main_entry': main_entry
-                })
+    pub_date = None
+    
+    # uid columns are int64, so match targets as ints whatever type the caller passed
+    if target_uids is not None:
+        target_uids = {int(uid) for uid in target_uids}
+    
+    # Column-oriented accumulators, so the DataFrames wrap the lists without transposing rows
+    acc = _new_accumulators()
+    strings = {}  # interning cache for program names and small-domain fields
+    
+    # Parallel extraction relies on forked workers; elsewhere parse serially
+    pool = None
+    if workers and workers > 1 and _CAN_FORK:
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    batch, pending = [], deque()
+    
+    try:
+        # Stream the document: only the current element is resident, never the whole tree
+        for _, entry in ET.iterparse(xml_file, events=('end',), tag=(_PUB_INFO_TAG, _ENTRY_TAG)):
+            # Publication info precedes the entries
+            if entry.tag == _PUB_INFO_TAG:
+                pub_date = entry.findtext(_PUBLISH_DATE_TAG)
+                record_count = entry.findtext(_RECORD_COUNT_TAG)
+                print(f"Publication Date: {pub_date}")
+                print(f"Total Records: {record_count}")
+                entry.clear(keep_tail=True)
+                continue
+            
+            # Skip untargeted entries before building any of their records
+            if target_uids is not None and int(entry.findtext(_UID_TAG)) not in target_uids:
+                _release(entry)
+                continue
+            
+            if pool is None:
+                _parse_entry(entry, acc, strings)
+            else:
+                batch.append(ET.tostring(entry))
+                if len(batch) == _BATCH_SIZE:
+                    pending.append(pool.submit(_parse_batch, batch))
+                    batch = []
+                    # Fold in finished batches as we go rather than holding every result to the
+                    # end, and wait on the oldest once 2x workers are queued, so a scan that
+                    # outpaces the workers cannot pile up serialized batches
+                    while pending and (pending[0].done() or len(pending) > 2 * workers):
+                        _merge_accumulators(acc, pending.popleft().result())
+            
+            _release(entry)
         
-        # ID Numbers (passports, tax IDs, etc.)
-        id_list = entry.find('sdn:idList', ns)
-        if id_list is not None:
-            for id_item in id_list.findall('sdn:id', ns):
-                id_uid = id_item.find('sdn:uid', ns).text
-                id_type = id_item.find('sdn:idType', ns)
-                id_type = id_type.text if id_type is not None else None
-                id_number = id_item.find('sdn:idNumber', ns)
-                id_number = id_number.text if id_number is not None else None
-                id_country = id_item.find('sdn:idCountry', ns)
-                id_country = id_country.text if id_country is not None else None
-                issue_date = id_item.find('sdn:issueDate', ns)
-                issue_date = issue_date.text if issue_date is not None else None
-                expiration_date = id_item.find('sdn:expirationDate', ns)
-                expiration_date = expiration_date.text if expiration_date is not None else None
-                
-                identifications.append({
-                    'entity_uid': uid,
-                    'id_uid': id_uid,
-                    'id_type': id_type,
-                    'id_number': id_number,
-                    'id_country': id_country,
-                    'issue_date': issue_date,
-                    'expiration_date': expiration_date
-                })
-    
-    # Convert to DataFrames
-    df_entities = pd.DataFrame(entities)
-    df_programs = pd.DataFrame(programs)
-    df_aliases = pd.DataFrame(aliases)
-    df_addresses = pd.DataFrame(addresses)
-    df_dob = pd.DataFrame(dates_of_birth)
-    df_pob = pd.DataFrame(places_of_birth)
-    df_nationalities = pd.DataFrame(nationalities)
-    df_ids = pd.DataFrame(identifications)
-    
-    print(f"\n✓ Parsed {len(entities)} entities")
-    print(f"✓ Found {len(programs)} program associations")
-    print(f"✓ Found {len(aliases)} aliases")
-    print(f"✓ Found {len(addresses)} addresses")
-    print(f"✓ Found {len(dates_of_birth)} dates of birth")
-    print(f"✓ Found {len(places_of_birth)} places of birth")
-    print(f"✓ Found {len(nationalities)} nationalities")
-    print(f"✓ Found {len(identifications)} identification documents")
+        # Collect worker results in submission order, so row order matches a serial parse
+        if pool is not None:
+            if batch:
+                pending.append(pool.submit(_parse_batch, batch))
+            for future in pending:
+                _merge_accumulators(acc, future.result())
+    finally:
+        # Also reached when the scan fails partway: drop queued batches and stop the workers
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    
+    return acc, pub_date
+
+def build_sdn_frames(acc, pub_date):
+    """Build the typed, uid-indexed DataFrames from extract_sdn_columns output"""
+    
+    # Convert to DataFrames (uid columns are already int64)
+    df_entities = _to_frame(acc['entities'])
+    df_programs = _to_frame(acc['programs'])
+    df_aliases = _to_frame(acc['aliases'])
+    df_addresses = _to_frame(acc['addresses'])
+    df_dob = _to_frame(acc['dob'])
+    df_pob = _to_frame(acc['pob'])
+    df_nationalities = _to_frame(acc['nationalities'])
+    df_ids = _to_frame(acc['ids'])
+    
+    # Low-cardinality labels as categoricals: far smaller, and isin/contains work per category
+    for df, column in [(df_entities, 'sdn_type'), (df_programs, 'program'),
+                       (df_aliases, 'type'), (df_aliases, 'category'),
+                       (df_addresses, 'country'), (df_nationalities, 'country'),
+                       (df_ids, 'id_type'), (df_ids, 'id_country')]:
+        df[column] = df[column].astype('category')
+    
+    # Index every frame by its owning entity uid (sorted) so filters become index lookups
+    for df, key in [(df_entities, 'uid'), (df_programs, 'uid'), (df_aliases, 'entity_uid'),
+                    (df_addresses, 'entity_uid'), (df_dob, 'entity_uid'), (df_pob, 'entity_uid'),
+                    (df_nationalities, 'entity_uid'), (df_ids, 'entity_uid')]:
+        df.set_index(key, drop=False, inplace=True)
+        df.sort_index(kind='stable', inplace=True)
+        df.index.name = None  # so groupby/merge/sort_values on the key column stay unambiguous
+    
+    print(f"\n✓ Parsed {len(df_entities)} entities")
+    print(f"✓ Found {len(df_programs)} program associations")
+    print(f"✓ Found {len(df_aliases)} aliases")
+    print(f"✓ Found {len(df_addresses)} addresses")
+    print(f"✓ Found {len(df_dob)} dates of birth")
+    print(f"✓ Found {len(df_pob)} places of birth")
+    print(f"✓ Found {len(df_nationalities)} nationalities")
+    print(f"✓ Found {len(df_ids)} identification documents")
     
     return {
         'entities': df_entities,
@@ -235,9 +317,23 @@ def parse_sdn_xml(xml_file):
         'pob': df_pob,
         'nationalities': df_nationalities,
         'ids': df_ids,
-        'pub_date': pub_date if pub_info is not None else None
+        'pub_date': pub_date
     }
 
+def parse_sdn_xml(xml_file, target_uids=None, workers=None):
+    """Parse the SDN XML file and extract all relevant data (see extract_sdn_columns)"""
+    return build_sdn_frames(*extract_sdn_columns(xml_file, target_uids, workers))
+
+def select_uids(df, key, uids):
+    """Rows of df whose key column is in uids (a pd.Index)
+    
+    Frames straight from parse_sdn_xml carry their key as a sorted index, which
+    turns this into an index lookup; any other frame falls back to isin.
+    """
+    if np.array_equal(df.index.to_numpy(), df[key].to_numpy()):
+        return df.loc[df.index.intersection(uids)]
+    return df[df[key].isin(uids)]
+
 def filter_hezbollah(data):
     """Filter for Hezbollah-related entities"""
     
@@ -246,27 +342,41 @@ def filter_hezbollah(data):
     print("="*60)
     
     # Get UIDs of all entities in Hezbollah program
-    hezbollah_uids = data['programs'][
-        data['programs']['program'].str.contains('HEZBOLLAH|HIZBALLAH|HIZBOLLAH', case=False, na=False)
-    ]['uid'].unique()
+    programs = data['programs']
+    program = programs['program']
+    if isinstance(program.dtype, pd.CategoricalDtype):
+        # Match each distinct program name once, then broadcast through the category codes
+        # (the trailing False is what missing programs, code -1, pick up)
+        is_hezbollah = program.cat.categories.str.contains(HEZBOLLAH_PROGRAM_PATTERN, na=False)
+        is_hezbollah = np.append(np.asarray(is_hezbollah, dtype=bool), False)
+        mask = is_hezbollah[program.cat.codes.to_numpy()]
+    else:
+        mask = program.str.contains(HEZBOLLAH_PROGRAM_PATTERN, na=False).to_numpy()
+    hezbollah_uids = programs.loc[mask, 'uid'].unique()
     
     print(f"\nFound {len(hezbollah_uids)} entities with Hezbollah program designation")
     
-    # Filter all dataframes
+    # Filter all dataframes on their owning entity uid
+    uid_idx = pd.Index(hezbollah_uids)
     hezbollah_data = {
-        'entities': data['entities'][data['entities']['uid'].isin(hezbollah_uids)],
-        'programs': data['programs'][data['programs']['uid'].isin(hezbollah_uids)],
-        'aliases': data['aliases'][data['aliases']['entity_uid'].isin(hezbollah_uids)],
-        'addresses': data['addresses'][data['addresses']['entity_uid'].isin(hezbollah_uids)],
-        'dob': data['dob'][data['dob']['entity_uid'].isin(hezbollah_uids)],
-        'pob': data['pob'][data['pob']['entity_uid'].isin(hezbollah_uids)],
-        'nationalities': data['nationalities'][data['nationalities']['entity_uid'].isin(hezbollah_uids)],
-        'ids': data['ids'][data['ids']['entity_uid'].isin(hezbollah_uids)],
-        'pub_date': data['pub_date']
+        key: select_uids(df, 'entity_uid' if 'entity_uid' in df.columns else 'uid', uid_idx)
+        for key, df in data.items() if isinstance(df, pd.DataFrame)
     }
+    hezbollah_data['pub_date'] = data['pub_date']
     
     return hezbollah_data
 
+def parse_hezbollah_xml(xml_file):
+    """Two-pass parse that only builds records for Hezbollah-designated entities
+    
+    Same result as filter_hezbollah(parse_sdn_xml(xml_file)), without materialising
+    the rest of the list; use it when the full dataset is not needed.
+    """
+    
+    hezbollah_uids = find_hezbollah_uids(xml_file)
+    print(f"Found {len(hezbollah_uids)} entities with Hezbollah program designation")
+    return parse_sdn_xml(xml_file, target_uids=hezbollah_uids)
+
 def analyze_south_america(hezbollah_data):
     """Analyze Hezbollah entities with South American connections"""
     
@@ -274,16 +384,9 @@ def analyze_south_america(hezbollah_data):
     print("SOUTH AMERICAN ANALYSIS")
     print("="*60)
     
-    south_american_countries = [
-        'Argentina', 'Brazil', 'Paraguay', 'Uruguay',
-        'Colombia', 'Venezuela', 'Chile', 'Peru', 'Bolivia',
-        'Ecuador', 'Guyana', 'Suriname', 'French Guiana'
-    ]
-    
     # Find entities with South American addresses
-    sa_addresses = hezbollah_data['addresses'][
-        hezbollah_data['addresses']['country'].isin(south_american_countries)
-    ]
+    addresses = hezbollah_data['addresses']
+    sa_addresses = addresses[in_countries(addresses['country'], SA_COUNTRIES)]
     
     sa_uids = sa_addresses['entity_uid'].unique()
     
@@ -293,18 +396,17 @@ def analyze_south_america(hezbollah_data):
     # Country breakdown
     print("\nBreakdown by country:")
     country_counts = sa_addresses['country'].value_counts()
+    country_counts = country_counts[country_counts > 0]  # skip unused categories
     for country, count in country_counts.items():
         print(f"  {country}: {count} addresses")
     
     # Get entities with SA connections
-    sa_entities = hezbollah_data['entities'][
-        hezbollah_data['entities']['uid'].isin(sa_uids)
-    ]
+    entities = hezbollah_data['entities']
+    sa_entities = select_uids(entities, 'uid', pd.Index(sa_uids))
     
     # Get all nationalities
-    sa_nationalities = hezbollah_data['nationalities'][
-        hezbollah_data['nationalities']['country'].isin(south_american_countries)
-    ]
+    nationalities = hezbollah_data['nationalities']
+    sa_nationalities = nationalities[in_countries(nationalities['country'], SA_COUNTRIES)]
     
     print(f"\nFound {len(sa_nationalities)} South American nationality records")
     
@@ -315,17 +417,24 @@ def analyze_south_america(hezbollah_data):
         'nationalities': sa_nationalities
     }
 
-def save_data(data, prefix='sdn'):
-    """Save data to CSV files"""
+def save_data(data, prefix='sdn', fmt='parquet', output_dir=OUTPUT_DIR):
+    """Save data to Parquet files (typed and columnar), or CSV with fmt='csv'"""
+    
+    if fmt == 'parquet' and not HAVE_PYARROW:
+        print("\npyarrow is not installed; saving CSV instead of Parquet")
+        fmt = 'csv'
     
     print(f"\n" + "="*60)
-    print(f"SAVING DATA TO CSV FILES")
+    print(f"SAVING DATA TO {fmt.upper()} FILES")
     print("="*60)
     
     for key, df in data.items():
         if isinstance(df, pd.DataFrame) and not df.empty:
-            filename = f"/home/claude/{prefix}_{key}.csv"
-            df.to_csv(filename, index=False)
+            filename = f"{output_dir}{prefix}_{key}.{fmt}"
+            if fmt == 'parquet':
+                df.to_parquet(filename, compression='zstd', index=False)
+            else:
+                df.to_csv(filename, index=False)
             print(f"✓ Saved {filename} ({len(df)} rows)")
 
 if __name__ == "__main__":
@@ -353,7 +462,8 @@ if __name__ == "__main__":
     print("\n" + "="*60)
     print("PARSING COMPLETE!")
     print("="*60)
+    ext = 'parquet' if HAVE_PYARROW else 'csv'
     print("\nOutput files created:")
-    print("  - sdn_full_*.csv - Complete OFAC SDN dataset")
-    print("  - hezbollah_*.csv - All Hezbollah-designated entities")
-    print("  - hezbollah_south_america_*.csv - Hezbollah entities with SA connections")
+    print(f"  - sdn_full_*.{ext} - Complete OFAC SDN dataset")
+    print(f"  - hezbollah_*.{ext} - All Hezbollah-designated entities")
+    print(f"  - hezbollah_south_america_*.{ext} - Hezbollah entities with SA connections")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Shared SDN helpers
+Constants, dtypes and loaders used by the parser, the analysis and the toolkit
+"""
+
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 - enables Parquet output and the Parquet cache
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+# Countries counted as South American connections
+SA_COUNTRIES = frozenset([
+    'Argentina', 'Brazil', 'Paraguay', 'Uruguay',
+    'Colombia', 'Venezuela', 'Chile', 'Peru', 'Bolivia',
+    'Ecuador', 'Guyana', 'Suriname', 'French Guiana'
+])
+
+# Integer uid columns so isin takes pandas' int64 hash path instead of object compares,
+# and low-cardinality labels as categoricals so isin/value_counts work on integer codes
+SDN_DTYPES = {
+    'uid': 'int64', 'entity_uid': 'int64',
+    'sdn_type': 'category', 'program': 'category', 'country': 'category',
+    'id_country': 'category', 'id_type': 'category'
+}
+
+def in_countries(series, countries):
+    """isin against a country set, resolved once on category codes for categorical columns"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = [code for code, country in enumerate(series.cat.categories) if country in countries]
+        return series.cat.codes.isin(codes)
+    return series.isin(countries)
+
+def parquet_cache_path(csv_path):
+    """Path of the Parquet copy of csv_path, rebuilt from the CSV when missing or stale
+    
+    The rebuild reads the whole CSV once. Without a CSV the Parquet file is taken as
+    the source, since parse_sdn.py writes its tables as Parquet directly.
+    """
+    parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+    if not os.path.exists(csv_path):
+        return parquet_path
+    stale = (not os.path.exists(parquet_path)
+             or os.path.getmtime(parquet_path) < os.path.getmtime(csv_path))
+    if stale:
+        pd.read_csv(csv_path, dtype=SDN_DTYPES).to_parquet(parquet_path, index=False)
+    return parquet_path
+
+def load_cached_table(csv_path):
+    """Load a table saved as CSV and/or Parquet, through the Parquet cache when possible"""
+    if not HAVE_PYARROW:
+        return pd.read_csv(csv_path, dtype=SDN_DTYPES)
+    return pd.read_parquet(parquet_cache_path(csv_path))